@@ -5,12 +5,22 @@
 
 from __future__ import annotations
 
+import codecs
+import functools
+import hashlib
+import io
 import os
 import re
 from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
 
 from anki.httpclient import HttpClient
 
+if TYPE_CHECKING:
+    import tiktoken
+    from bs4 import Tag
+
 # Token estimation constants
 # Average characters per token for English text (rough approximation)
 CHARS_PER_TOKEN = 4
@@ -18,6 +28,40 @@ CHARS_PER_TOKEN = 4
 MAX_INPUT_TOKENS = 12000
 MAX_CHARS = MAX_INPUT_TOKENS * CHARS_PER_TOKEN
 
+_EXCESS_WHITESPACE_RE = re.compile(r"\n{3,}| {2,}")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Elements that typically contain non-content, removed from fetched pages
+_UNWANTED_TAGS = frozenset(
+    (
+        "script",
+        "style",
+        "nav",
+        "footer",
+        "header",
+        "aside",
+        "noscript",
+        "iframe",
+        "form",
+    )
+)
+_UNWANTED_ROLES = frozenset(("navigation", "banner", "contentinfo"))
+_UNWANTED_CLASSES = frozenset(
+    (
+        "sidebar",
+        "menu",
+        "navigation",
+        "nav",
+        "footer",
+        "header",
+        "advertisement",
+        "ad",
+        "social-share",
+        "comments",
+    )
+)
+_UNWANTED_IDS = frozenset(("sidebar", "menu", "navigation", "nav", "footer", "header"))
+
 
 class DocumentParseError(Exception):
     """Raised when document parsing fails."""
@@ -25,6 +69,23 @@ class DocumentParseError(Exception):
     pass
 
 
+def _is_unwanted_element(tag: Tag) -> bool:
+    """Return True if the tag matches one of the non-content filters."""
+    return (
+        tag.name in _UNWANTED_TAGS
+        or tag.get("role") in _UNWANTED_ROLES
+        or tag.get("id") in _UNWANTED_IDS
+        or not _UNWANTED_CLASSES.isdisjoint(tag.get("class") or ())
+    )
+
+
+def _collapse_whitespace(text: str) -> str:
+    """Collapse runs of 3+ newlines to a paragraph break, and runs of spaces to one."""
+    return _EXCESS_WHITESPACE_RE.sub(
+        lambda m: "\n\n" if m.group()[0] == "\n" else " ", text
+    )
+
+
 def parse_pdf(file_path: str) -> str:
     """Extract text content from a PDF file.
 
@@ -49,22 +110,35 @@ def parse_pdf(file_path: str) -> str:
 
     try:
         doc = fitz.open(file_path)
-        text_parts = []
-
+        # Write pages straight into one buffer rather than keeping a list of
+        # per-page strings around for a final join
+        buf = io.StringIO()
+        # Plain-text extraction only; ligature glyphs are expanded to their
+        # component letters so they tokenize like ordinary text
+        flags = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES
+
+        # Pages are extracted sequentially on purpose: PyMuPDF is not
+        # thread-safe and holds the GIL during extraction, so a thread pool
+        # would risk crashes without any speedup.
         for page_num, page in enumerate(doc, start=1):
-            page_text = page.get_text()
-            if page_text.strip():
-                text_parts.append(f"--- Page {page_num} ---\n{page_text}")
+            page_text = page.get_text("text", flags=flags)
+            # isspace() stops at the first visible character, without
+            # building a stripped copy of the page
+            if page_text and not page_text.isspace():
+                if buf.tell():
+                    buf.write("\n\n")
+                buf.write(f"--- Page {page_num} ---\n")
+                buf.write(page_text)
 
         doc.close()
 
-        if not text_parts:
+        if not buf.tell():
             raise DocumentParseError(
                 "No text could be extracted from the PDF. "
                 "The file may be scanned images without OCR."
             )
 
-        return "\n\n".join(text_parts)
+        return buf.getvalue()
 
     except fitz.FileDataError as e:
         raise DocumentParseError(f"Invalid or corrupted PDF file: {e}") from e
@@ -95,13 +169,18 @@ def parse_text_file(file_path: str) -> str:
         )
 
     try:
-        # Try UTF-8 first, then fall back to other encodings
-        encodings = ["utf-8", "utf-8-sig", "latin-1", "cp1252"]
+        # Read once and try each encoding in memory
+        raw = path.read_bytes()
+
+        # Try UTF-8 first (dropping any byte order mark), then fall back to
+        # other encodings
+        utf8 = "utf-8-sig" if raw.startswith(codecs.BOM_UTF8) else "utf-8"
+        encodings = [utf8, "latin-1", "cp1252"]
         content = None
 
         for encoding in encodings:
             try:
-                content = path.read_text(encoding=encoding)
+                content = raw.decode(encoding)
                 break
             except UnicodeDecodeError:
                 continue
@@ -111,6 +190,10 @@ def parse_text_file(file_path: str) -> str:
                 "Could not decode file with any supported encoding"
             )
 
+        # Match the universal newline handling of text-mode reads
+        if "\r" in content:
+            content = content.replace("\r\n", "\n").replace("\r", "\n")
+
         if not content.strip():
             raise DocumentParseError("File is empty")
 
@@ -136,6 +219,7 @@ def parse_url(url: str) -> str:
     """
     try:
         from bs4 import BeautifulSoup
+        from bs4.builder import builder_registry
     except ImportError as e:
         raise DocumentParseError(
             "URL parsing requires BeautifulSoup. Install with: pip install beautifulsoup4"
@@ -151,41 +235,14 @@ def parse_url(url: str) -> str:
             response.raise_for_status()
             html_content = client.stream_content(response)
 
-        soup = BeautifulSoup(html_content, "html.parser")
+        # Prefer the C-based lxml parser when it is installed
+        parser = "lxml" if builder_registry.lookup("lxml") else "html.parser"
+        soup = BeautifulSoup(html_content, parser)
 
         # Remove unwanted elements that typically contain non-content
-        unwanted_selectors = [
-            "script",
-            "style",
-            "nav",
-            "footer",
-            "header",
-            "aside",
-            "noscript",
-            "iframe",
-            "form",
-            "[role='navigation']",
-            "[role='banner']",
-            "[role='contentinfo']",
-            ".sidebar",
-            ".menu",
-            ".navigation",
-            ".nav",
-            ".footer",
-            ".header",
-            ".advertisement",
-            ".ad",
-            ".social-share",
-            ".comments",
-            "#sidebar",
-            "#menu",
-            "#navigation",
-            "#nav",
-            "#footer",
-            "#header",
-        ]
-        for selector in unwanted_selectors:
-            for element in soup.select(selector):
+        for element in soup.find_all(_is_unwanted_element):
+            # Skip elements already removed along with an unwanted ancestor
+            if not element.decomposed:
                 element.decompose()
 
         # Try to find main content area with multiple strategies
@@ -232,25 +289,28 @@ def parse_url(url: str) -> str:
 
         # Strategy 5: Find the largest text container
         if not main_content:
-            # Fall back to finding the div with the most paragraph content
-            from bs4 import Tag
-
-            divs_with_paragraphs: list[tuple[Tag, int]] = []
-            for div in soup.find_all("div"):
-                if isinstance(div, Tag):
-                    paragraphs = div.find_all("p", recursive=True)
-                    if paragraphs:
-                        total_text = sum(
-                            len(p.get_text(strip=True))
-                            for p in paragraphs
-                            if isinstance(p, Tag)
-                        )
-                        divs_with_paragraphs.append((div, total_text))
-
-            if divs_with_paragraphs:
-                # Sort by text length and take the one with most content
-                divs_with_paragraphs.sort(key=lambda x: x[1], reverse=True)
-                main_content = divs_with_paragraphs[0][0]
+            # Fall back to finding the div with the most paragraph content.
+            # Walk divs and paragraphs once in document order, crediting each
+            # paragraph's text length to all of its div ancestors.
+            divs: list[Tag] = []
+            paragraph_text: dict[int, int] = {}
+            for tag in soup.find_all(("div", "p")):
+                if tag.name == "div":
+                    divs.append(tag)
+                    continue
+                length = len(tag.get_text(strip=True))
+                for parent in tag.parents:
+                    if parent.name == "div":
+                        key = id(parent)
+                        paragraph_text[key] = paragraph_text.get(key, 0) + length
+
+            # Take the first div with the most content
+            best_total = -1
+            for div in divs:
+                total_text = paragraph_text.get(id(div), -1)
+                if total_text > best_total:
+                    best_total = total_text
+                    main_content = div
 
         # Strategy 6: Fall back to body
         if not main_content:
@@ -262,8 +322,7 @@ def parse_url(url: str) -> str:
             text = soup.get_text(separator="\n", strip=True)
 
         # Clean up excessive whitespace
-        text = re.sub(r"\n{3,}", "\n\n", text)
-        text = re.sub(r" {2,}", " ", text)
+        text = _collapse_whitespace(text)
 
         if not text.strip():
             raise DocumentParseError("No text content could be extracted from the URL")
@@ -295,17 +354,39 @@ def parse_pasted_text(text: str) -> str:
     text = text.replace("\r\n", "\n").replace("\r", "\n")
 
     # Clean up excessive whitespace while preserving paragraph breaks
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r" {2,}", " ", text)
+    text = _collapse_whitespace(text)
 
     return text.strip()
 
 
+@functools.lru_cache(maxsize=1)
+def _get_encoder() -> tiktoken.Encoding | None:
+    """Return the shared tiktoken encoder, or None if tiktoken is unavailable.
+
+    Building the encoder loads the BPE ranks from disk, so it is done once
+    per process.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    # Use cl100k_base encoding (used by gpt-4, gpt-3.5-turbo)
+    return tiktoken.get_encoding("cl100k_base")
+
+
+# The same document is usually counted several times in a row, eg for a cost
+# estimate and again when chunking it for generation. Counts are keyed on a
+# digest of the text, so the cache does not keep whole documents alive.
+_TOKEN_COUNT_CACHE_SIZE = 8
+_token_counts: dict[bytes, int] = {}
+
+
 def estimate_tokens(text: str) -> int:
     """Estimate the number of tokens in the text.
 
-    This is a rough estimate based on character count.
-    For accurate counting, use tiktoken with the specific model's tokenizer.
+    Uses tiktoken for accurate counting when available, and falls back to a
+    rough estimate based on character count otherwise.
 
     Args:
         text: The text to estimate tokens for
@@ -313,17 +394,43 @@ def estimate_tokens(text: str) -> int:
     Returns:
         Estimated token count
     """
-    # Try to use tiktoken for accurate counting
-    try:
-        import tiktoken
-
-        # Use cl100k_base encoding (used by gpt-4, gpt-3.5-turbo)
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text))
-    except ImportError:
+    encoder = _get_encoder()
+    if encoder is None:
         # Fall back to character-based estimation
         return len(text) // CHARS_PER_TOKEN
 
+    key = hashlib.blake2b(
+        text.encode("utf-8", "surrogatepass"), digest_size=16
+    ).digest()
+    count = _token_counts.get(key)
+    if count is None:
+        count = len(encoder.encode(text, disallowed_special=()))
+        if len(_token_counts) >= _TOKEN_COUNT_CACHE_SIZE:
+            # Evict the oldest entry
+            _token_counts.pop(next(iter(_token_counts), key), None)
+        _token_counts[key] = count
+    return count
+
+
+@functools.lru_cache(maxsize=1)
+def _max_token_bytes(encoder: tiktoken.Encoding) -> int:
+    """Return the length in bytes of the longest token in the vocabulary."""
+    return max(map(len, encoder.token_byte_values()))
+
+
+def _estimate_tokens_batch(
+    texts: list[str], encoder: tiktoken.Encoding | None
+) -> list[int]:
+    """Estimate token counts for several texts with a single encoder call."""
+    if encoder is None:
+        return [len(text) // CHARS_PER_TOKEN for text in texts]
+    if len(texts) == 1:
+        # Not worth spinning up the batch thread pool
+        return [len(encoder.encode_ordinary(texts[0]))]
+    # tiktoken releases the GIL while encoding, so use a thread per core
+    batch = encoder.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+    return [len(tokens) for tokens in batch]
+
 
 def chunk_text(text: str, max_tokens: int = MAX_INPUT_TOKENS) -> list[str]:
     """Split text into chunks that fit within token limits.
@@ -335,52 +442,87 @@ def chunk_text(text: str, max_tokens: int = MAX_INPUT_TOKENS) -> list[str]:
     Returns:
         List of text chunks
     """
-    # Estimate total tokens
-    total_tokens = estimate_tokens(text)
-
-    if total_tokens <= max_tokens:
+    # Every token covers at least one byte, so ASCII text no longer than the
+    # limit always fits
+    if len(text) <= max_tokens and text.isascii():
         return [text]
 
+    # Resolve the encoder once rather than for every batch below
+    encoder = _get_encoder()
+
+    # No token is longer than the longest entry in the vocabulary, so text
+    # beyond that many characters per token cannot fit. Skip tokenizing the
+    # whole document then, and go straight to the paragraph pass.
+    if encoder is None or len(text) <= max_tokens * _max_token_bytes(encoder):
+        # Estimate total tokens
+        total_tokens = estimate_tokens(text)
+
+        if total_tokens <= max_tokens:
+            return [text]
+
     # Split by paragraphs first
     paragraphs = text.split("\n\n")
-    chunks = []
-    current_chunk: list[str] = []
+    chunks: list[str] = []
+    # Sentences left over from splitting an oversized paragraph
+    current_sentences: list[str] = []
+    # Whole paragraphs in the current chunk are tracked as a span of the
+    # original text. As paragraphs were split on "\n\n", slicing the span
+    # gives the same result as joining them, without building a list.
+    span_start: int | None = None
+    span_end = 0
     current_tokens = 0
 
-    for para in paragraphs:
-        para_tokens = estimate_tokens(para)
+    def flush() -> None:
+        nonlocal span_start, current_tokens
+        if span_start is None:
+            chunks.append("\n\n".join(current_sentences))
+        elif current_sentences:
+            current_sentences.append(text[span_start:span_end])
+            chunks.append("\n\n".join(current_sentences))
+        else:
+            chunks.append(text[span_start:span_end])
+        current_sentences.clear()
+        span_start = None
+        current_tokens = 0
+
+    para_start = 0
+    for para, para_tokens in zip(
+        paragraphs, _estimate_tokens_batch(paragraphs, encoder)
+    ):
+        para_end = para_start + len(para)
 
         # If a single paragraph is too large, split by sentences
         if para_tokens > max_tokens:
-            if current_chunk:
-                chunks.append("\n\n".join(current_chunk))
-                current_chunk = []
-                current_tokens = 0
+            if current_sentences or span_start is not None:
+                flush()
 
             # Split long paragraph by sentences
-            sentences = re.split(r"(?<=[.!?])\s+", para)
-            for sentence in sentences:
-                sent_tokens = estimate_tokens(sentence)
+            sentences = _SENTENCE_END_RE.split(para)
+            for sentence, sent_tokens in zip(
+                sentences, _estimate_tokens_batch(sentences, encoder)
+            ):
                 if current_tokens + sent_tokens > max_tokens:
-                    if current_chunk:
-                        chunks.append(" ".join(current_chunk))
-                    current_chunk = [sentence]
+                    if current_sentences:
+                        chunks.append(" ".join(current_sentences))
+                    current_sentences[:] = [sentence]
                     current_tokens = sent_tokens
                 else:
-                    current_chunk.append(sentence)
+                    current_sentences.append(sentence)
                     current_tokens += sent_tokens
-        elif current_tokens + para_tokens > max_tokens:
-            # Start a new chunk
-            chunks.append("\n\n".join(current_chunk))
-            current_chunk = [para]
-            current_tokens = para_tokens
         else:
-            current_chunk.append(para)
+            if current_tokens + para_tokens > max_tokens:
+                # Start a new chunk
+                flush()
+            if span_start is None:
+                span_start = para_start
+            span_end = para_end
             current_tokens += para_tokens
 
+        para_start = para_end + 2
+
     # Don't forget the last chunk
-    if current_chunk:
-        chunks.append("\n\n".join(current_chunk))
+    if current_sentences or span_start is not None:
+        flush()
 
     return chunks
 
@@ -398,14 +540,17 @@ def get_source_name(source: str, source_type: str) -> str:
     if source_type == "file":
         return Path(source).name
     elif source_type == "url":
-        # Extract domain and path
-        from urllib.parse import urlparse
-
-        parsed = urlparse(source)
-        path = parsed.path.strip("/")
-        if path:
-            return f"{parsed.netloc}/{path.split('/')[-1]}"
-        return parsed.netloc
+        return _url_source_name(source)
     else:
         # For pasted text, use a generic name
         return "pasted_text"
+
+
+@functools.lru_cache(maxsize=512)
+def _url_source_name(url: str) -> str:
+    """Build a source name from a URL's domain and last path segment."""
+    parsed = urlparse(url)
+    path = parsed.path.strip("/")
+    if path:
+        return f"{parsed.netloc}/{path.split('/')[-1]}"
+    return parsed.netloc
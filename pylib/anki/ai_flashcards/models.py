@@ -5,14 +5,22 @@
 
 from __future__ import annotations
 
+import sys
+import time
 import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import Any
 
+# Slotted dataclasses use less memory per instance, but need Python 3.10+
+_SLOTS: dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-class CardType(Enum):
+# Characters replaced with underscores when turning a source name into a tag
+_SOURCE_TAG_TRANSLATION = str.maketrans(" /\\:", "____")
+
+
+class CardType(str, Enum):
     """Type of flashcard to generate."""
 
     BASIC = "basic"
@@ -20,7 +28,7 @@ class CardType(Enum):
     CLOZE = "cloze"
 
 
-class CardStatus(Enum):
+class CardStatus(str, Enum):
     """Status of a generated card in the review workflow."""
 
     PENDING = "pending"
@@ -29,14 +37,14 @@ class CardStatus(Enum):
     REGENERATING = "regenerating"
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class GeneratedCard:
     """A single AI-generated flashcard."""
 
     card_type: CardType
     front: str
     back: str
-    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
     suggested_tags: list[str] = field(default_factory=list)
     status: CardStatus = CardStatus.PENDING
 
@@ -44,18 +52,18 @@ class GeneratedCard:
         """Convert to dictionary for JSON serialization."""
         return {
             "id": self.id,
-            "type": self.card_type.value,
+            "type": self.card_type,
             "front": self.front,
             "back": self.back,
             "tags": self.suggested_tags,
-            "status": self.status.value,
+            "status": self.status,
         }
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> GeneratedCard:
         """Create from dictionary (JSON deserialization)."""
         return cls(
-            id=data.get("id", str(uuid.uuid4())),
+            id=data["id"] if "id" in data else uuid.uuid4().hex,
             card_type=CardType(data["type"]),
             front=data["front"],
             back=data.get("back", ""),
@@ -64,7 +72,7 @@ class GeneratedCard:
         )
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class GenerationConfig:
     """Configuration for flashcard generation."""
 
@@ -78,22 +86,17 @@ class GenerationConfig:
         if not self.source_name:
             return ""
         # Sanitize the source name for use as a tag
-        safe_name = (
-            self.source_name.replace(" ", "_")
-            .replace("/", "_")
-            .replace("\\", "_")
-            .replace(":", "_")
-        )
+        safe_name = self.source_name.translate(_SOURCE_TAG_TRANSLATION)
         return f"source::{safe_name}"
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class GenerationSession:
     """A session containing generated cards and metadata."""
 
     cards: list[GeneratedCard]
     source_name: str
-    session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
     created_at: datetime = field(default_factory=datetime.now)
     version: int = 1
 
@@ -112,7 +115,9 @@ class GenerationSession:
         """Create from dictionary (JSON deserialization)."""
         return cls(
             version=data.get("version", 1),
-            session_id=data.get("session_id", str(uuid.uuid4())),
+            session_id=(
+                data["session_id"] if "session_id" in data else uuid.uuid4().hex
+            ),
             created_at=datetime.fromisoformat(data["created_at"]),
             source_name=data["source_name"],
             cards=[GeneratedCard.from_dict(c) for c in data.get("cards", [])],
@@ -128,11 +133,11 @@ class GenerationSession:
 
     def is_expired(self, max_age_days: int = 7) -> bool:
         """Check if the session has expired."""
-        age = datetime.now() - self.created_at
-        return age.days >= max_age_days
+        # Compare Unix timestamps, which avoids building a timedelta
+        return time.time() - self.created_at.timestamp() >= max_age_days * 86400
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class CostEstimate:
     """Estimated cost for processing a document."""
 
@@ -149,7 +154,7 @@ class CostEstimate:
         }
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class GenerationResult:
     """Result of flashcard generation including cards and cost data."""
 
@@ -157,6 +162,8 @@ class GenerationResult:
     tokens_used: int
     cost_usd: float
     model: str
+    # Requests of a batch job that returned an error instead of cards
+    failed_requests: int = 0
 
     def to_dict(self) -> dict[str, Any]:
         """Convert to dictionary."""
@@ -165,4 +172,5 @@ class GenerationResult:
             "tokens_used": self.tokens_used,
             "cost_usd": self.cost_usd,
             "model": self.model,
+            "failed_requests": self.failed_requests,
         }
@@ -5,11 +5,12 @@
 
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import json
-import re
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable
 
-from anki.ai_flashcards.document_parser import chunk_text, estimate_tokens
+from anki.ai_flashcards.document_parser import chunk_text
 from anki.ai_flashcards.models import (
     CardType,
     CostEstimate,
@@ -17,16 +18,44 @@ from anki.ai_flashcards.models import (
     GenerationConfig,
     GenerationResult,
 )
-
-# OpenAI model configuration
-DEFAULT_MODEL = "gpt-4o"
-# Pricing per 1M tokens (as of late 2024)
-MODEL_PRICING = {
-    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
-    "gpt-4o": {"input": 2.50, "output": 10.00},
-    "gpt-4-turbo": {"input": 10.00, "output": 30.00},
-}
-
+from anki.ai_flashcards.pricing import (
+    DEFAULT_MODEL,
+    MODEL_PRICING,
+    MODEL_PRICING_BATCH,
+    estimate_cost,
+)
+from anki.utils import from_json_bytes, to_json_bytes
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletionSystemMessageParam
+
+try:
+    import openai
+except ImportError:
+    # Checked when the client is used, so the error can be shown in the UI
+    openai = None  # type: ignore[assignment]
+
+_OPENAI_MISSING = "OpenAI library not installed. Run: pip install openai"
+
+# Batch API job states that have not produced an output file yet
+_BATCH_PENDING_STATES = ("validating", "in_progress", "finalizing")
+# Characters of source text included when regenerating a card
+REGENERATE_EXCERPT_CHARS = 2000
+# Card types by their JSON value, for parsing responses
+_CARD_TYPE_MAP = {card_type.value: card_type for card_type in CardType}
+# Maximum number of chunk requests in flight at once
+MAX_CONCURRENT_REQUESTS = 8
+# Retries for rate limited, timed out, 5xx and dropped requests. The OpenAI
+# library backs off exponentially with jitter between attempts, and waits as
+# long as a Retry-After header asks.
+MAX_RETRIES = 5
+# HTTP/2 lets concurrent requests share one connection, but httpx only
+# supports it when the optional h2 package is installed
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# The system prompt must stay free of per-request content and be sent first, so
+# that OpenAI can serve it from the prompt cache. Caching only applies to
+# prefixes of 1024 tokens or more, which the examples below take it past.
 SYSTEM_PROMPT = """### ROLE ###
 You are an expert in cognitive science and learning theory, specializing in creating optimal study materials for spaced repetition systems like Anki. Your goal is to generate high-quality, effective flashcards that maximize long-term retention.
 
@@ -74,6 +103,33 @@ Apply these cognitive science principles to every card:
 - ✅ GOOD (Testing key concept):
   - Front: "The {{c1::mitochondria}} is the organelle responsible for producing ATP through cellular respiration."
 
+**Example 4: Reversed card for terminology**
+- ❌ BAD (Definition copied verbatim, hard to recall in reverse):
+  - Front: "Osmosis"
+  - Back: "The spontaneous net movement of solvent molecules through a selectively permeable membrane into a region of higher solute concentration."
+- ✅ GOOD (Short enough to recall in both directions):
+  - Front: "Osmosis"
+  - Back: "Movement of water across a membrane toward higher solute concentration."
+
+**Example 5: Splitting a process into atomic cards**
+- ❌ BAD (One card for a whole sequence):
+  - Front: "What are the stages of mitosis?"
+  - Back: "Prophase, metaphase, anaphase and telophase, during which chromosomes condense, align, separate and are enclosed in new nuclei."
+- ✅ GOOD (One step per card):
+  - Front: "During which stage of mitosis do chromosomes align at the cell's equator?"
+  - Back: "Metaphase."
+  - Front: "What happens to sister chromatids during anaphase?"
+  - Back: "They are pulled to opposite poles of the cell."
+  - Front: "Mitosis begins with {{c1::prophase}}, when chromosomes condense."
+
+**Example 6: Avoiding context-dependent questions**
+- ❌ BAD (Depends on the source text):
+  - Front: "What does the author say is the main cause of inflation?"
+  - Back: "Growth in the money supply."
+- ✅ GOOD (Stands on its own):
+  - Front: "According to monetarist theory, what is the main long-run cause of inflation?"
+  - Back: "Growth in the money supply."
+
 ### OUTPUT FORMAT ###
 Respond ONLY with valid JSON in this exact format:
 {
@@ -99,6 +155,12 @@ Important:
 - suggested_tags should be lowercase, no spaces (use underscores)
 """
 
+# Shared by every request; the API client does not modify messages
+_SYSTEM_MESSAGE: ChatCompletionSystemMessageParam = {
+    "role": "system",
+    "content": SYSTEM_PROMPT,
+}
+
 
 class OpenAIError(Exception):
     """Raised when OpenAI API calls fail."""
@@ -109,7 +171,11 @@ class OpenAIError(Exception):
 class OpenAIFlashcardClient:
     """Client for generating flashcards using OpenAI API."""
 
-    def __init__(self, api_key: str, model: str = DEFAULT_MODEL):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = DEFAULT_MODEL,
+    ):
         """Initialize the client.
 
         Args:
@@ -121,6 +187,30 @@ class OpenAIFlashcardClient:
 
         self.api_key = api_key
         self.model = model
+        self._client: openai.OpenAI | None = None
+
+    @property
+    def client(self) -> openai.OpenAI:
+        """The OpenAI client, created on first use and then reused.
+
+        Sharing one client keeps its connection pool alive between calls.
+        The async client used by generate_flashcards() is not shared, as it
+        is bound to the event loop of a single call.
+
+        Raises:
+            OpenAIError: If the openai library is not installed
+        """
+        if self._client is None:
+            _require_openai()
+            http_client = (
+                openai.DefaultHttpxClient(http2=True) if _HTTP2_AVAILABLE else None
+            )
+            self._client = openai.OpenAI(
+                api_key=self.api_key,
+                http_client=http_client,
+                max_retries=MAX_RETRIES,
+            )
+        return self._client
 
     def test_connection(self) -> tuple[bool, str | None]:
         """Test the API connection and key validity.
@@ -128,17 +218,21 @@ class OpenAIFlashcardClient:
         Returns:
             Tuple of (success, error_message)
         """
-        try:
-            import openai
+        if openai is None:
+            return False, _OPENAI_MISSING
 
-            client = openai.OpenAI(api_key=self.api_key)
-            # Make a minimal API call to verify the key
-            client.models.list()
+        try:
+            # Make a minimal API call to verify the key, fetching only the
+            # model we will use rather than the whole model list. Keep the
+            # library's default retries, so a failing test is reported quickly.
+            self.client.with_options(
+                max_retries=openai.DEFAULT_MAX_RETRIES
+            ).models.retrieve(self.model)
             return True, None
-        except ImportError:
-            return False, "OpenAI library not installed. Run: pip install openai"
         except openai.AuthenticationError:
             return False, "Invalid API key"
+        except openai.NotFoundError:
+            return False, f"Model '{self.model}' is not available for this API key"
         except openai.RateLimitError:
             return False, "Rate limit exceeded. Please try again later."
         except openai.APIConnectionError:
@@ -155,31 +249,22 @@ class OpenAIFlashcardClient:
         Returns:
             Cost estimate with tokens and USD
         """
-        input_tokens = estimate_tokens(text)
-        # Estimate output tokens (roughly 50% of input for flashcards)
-        output_tokens = input_tokens // 2
-
-        pricing = MODEL_PRICING.get(self.model, MODEL_PRICING[DEFAULT_MODEL])
-        cost = (
-            input_tokens * pricing["input"] + output_tokens * pricing["output"]
-        ) / 1_000_000
-
-        return CostEstimate(
-            estimated_tokens=input_tokens + output_tokens,
-            estimated_cost_usd=round(cost, 4),
-            model=self.model,
-        )
+        return estimate_cost(text, self.model)
 
     def generate_flashcards(
         self,
         text: str,
         config: GenerationConfig,
+        on_card: Callable[[GeneratedCard], None] | None = None,
     ) -> GenerationResult:
         """Generate flashcards from the given text.
 
         Args:
             text: The source text to generate cards from
             config: Generation configuration
+            on_card: Optional callback, called on the calling thread with
+                each card as soon as it has been received. When given,
+                responses are streamed so cards can be shown progressively.
 
         Returns:
             GenerationResult with cards and cost data
@@ -187,76 +272,313 @@ class OpenAIFlashcardClient:
         Raises:
             OpenAIError: If generation fails
         """
+        _require_openai()
+
+        requests = self._chunk_requests(text, config)
+
         try:
-            import openai
-        except ImportError as e:
-            raise OpenAIError(
-                "OpenAI library not installed. Run: pip install openai"
-            ) from e
+            responses = asyncio.run(self._generate_chunks(requests, config, on_card))
+        except openai.APIError as e:
+            raise OpenAIError(f"API error: {e}") from e
 
-        # Chunk text if needed
-        chunks = chunk_text(text)
         all_cards: list[GeneratedCard] = []
         total_prompt_tokens = 0
         total_completion_tokens = 0
+        total_cached_tokens = 0
 
-        client = openai.OpenAI(api_key=self.api_key)
-
-        for i, chunk in enumerate(chunks):
-            chunk_limit = config.card_limit - len(all_cards)
-            if chunk_limit <= 0:
-                break
-
-            try:
-                response = client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {
-                            "role": "user",
-                            "content": self._build_user_prompt(
-                                chunk,
-                                GenerationConfig(
-                                    card_limit=chunk_limit,
-                                    preferred_card_type=config.preferred_card_type,
-                                    source_name=config.source_name,
-                                    auto_tags=config.auto_tags,
-                                ),
-                            ),
-                        },
-                    ],
-                    temperature=0.7,
-                    max_tokens=4000,
-                    response_format={"type": "json_object"},
-                )
+        for cards, usage in responses:
+            all_cards.extend(cards)
+
+            # Track token usage
+            if usage:
+                total_prompt_tokens += usage.prompt_tokens
+                total_completion_tokens += usage.completion_tokens
+                details = usage.prompt_tokens_details
+                if details and details.cached_tokens:
+                    total_cached_tokens += details.cached_tokens
 
-                # Track token usage
-                if response.usage:
-                    total_prompt_tokens += response.usage.prompt_tokens
-                    total_completion_tokens += response.usage.completion_tokens
+        # Calculate actual cost
+        pricing = MODEL_PRICING.get(self.model, MODEL_PRICING[DEFAULT_MODEL])
+        cost_usd = _calculate_cost(
+            pricing, total_prompt_tokens, total_cached_tokens, total_completion_tokens
+        )
+
+        return GenerationResult(
+            cards=all_cards[: config.card_limit],
+            tokens_used=total_prompt_tokens + total_completion_tokens,
+            cost_usd=round(cost_usd, 6),
+            model=self.model,
+        )
+
+    async def _generate_chunks(
+        self,
+        requests: list[tuple[str, int]],
+        config: GenerationConfig,
+        on_card: Callable[[GeneratedCard], None] | None = None,
+    ) -> list[tuple[list[GeneratedCard], Any]]:
+        """Request cards for each (chunk, card_limit) pair concurrently.
+
+        Returns (cards, usage) pairs in the same order as the requests, with
+        no more cards per chunk than its limit. At most MAX_CONCURRENT_REQUESTS are in flight
+        at once, and failed requests are retried up to MAX_RETRIES times.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        http_client = (
+            openai.DefaultAsyncHttpxClient(http2=True) if _HTTP2_AVAILABLE else None
+        )
+        async with openai.AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=http_client,
+            max_retries=MAX_RETRIES,
+        ) as client:
+
+            async def generate_one(
+                chunk: str, chunk_limit: int
+            ) -> tuple[list[GeneratedCard], Any]:
+                params = self._chunk_request_params(chunk, chunk_limit, config)
+                async with semaphore:
+                    if on_card:
+                        return await self._stream_chunk(
+                            client, params, chunk_limit, config, on_card
+                        )
+                    response = await client.chat.completions.create(**params)
 
                 content = response.choices[0].message.content
+                cards: list[GeneratedCard] = []
                 if content:
-                    cards = self._parse_response(content, config)
-                    all_cards.extend(cards)
+                    cards = self._parse_response(content, config)[:chunk_limit]
+                return cards, response.usage
 
-            except openai.APIError as e:
-                raise OpenAIError(f"API error: {e}") from e
+            return await asyncio.gather(
+                *(generate_one(chunk, limit) for chunk, limit in requests)
+            )
 
-        # Calculate actual cost
-        pricing = MODEL_PRICING.get(self.model, MODEL_PRICING[DEFAULT_MODEL])
-        total_tokens = total_prompt_tokens + total_completion_tokens
-        cost_usd = (
-            total_prompt_tokens * pricing["input"]
-            + total_completion_tokens * pricing["output"]
-        ) / 1_000_000
+    async def _stream_chunk(
+        self,
+        client: Any,
+        params: dict[str, Any],
+        chunk_limit: int,
+        config: GenerationConfig,
+        on_card: Callable[[GeneratedCard], None],
+    ) -> tuple[list[GeneratedCard], Any]:
+        """Stream the response for one chunk, passing cards to on_card.
+
+        Returns the cards and the token usage.
+        """
+        stream = await client.chat.completions.create(
+            **params, stream=True, stream_options={"include_usage": True}
+        )
+
+        parser = _CardStreamParser()
+        parts: list[str] = []
+        cards: list[GeneratedCard] = []
+        usage = None
+
+        async for event in stream:
+            if event.usage:
+                usage = event.usage
+            if not event.choices or not event.choices[0].delta.content:
+                continue
+            delta = event.choices[0].delta.content
+            parts.append(delta)
+            for card in self._cards_from_data(parser.feed(delta), config):
+                if len(cards) < chunk_limit:
+                    cards.append(card)
+                    on_card(card)
+
+        content = "".join(parts)
+        if not cards and content:
+            # Nothing recognisable arrived while streaming, eg because the
+            # JSON was wrapped in other text; parse the response as a whole
+            cards = self._parse_response(content, config)[:chunk_limit]
+            for card in cards:
+                on_card(card)
+
+        return cards, usage
+
+    def generate_flashcards_batch(
+        self,
+        text: str,
+        config: GenerationConfig,
+    ) -> str:
+        """Submit flashcard generation as an OpenAI Batch API job.
+
+        Batch jobs are billed at half the usual rate and have their own rate
+        limits, but may take up to 24 hours to complete. Use poll_batch() to
+        collect the result.
+
+        Args:
+            text: The source text to generate cards from
+            config: Generation configuration
+
+        Returns:
+            ID of the submitted batch job
+
+        Raises:
+            OpenAIError: If the job could not be submitted
+        """
+        _require_openai()
+
+        lines = [
+            to_json_bytes(
+                {
+                    "custom_id": f"chunk-{i}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._chunk_request_params(chunk, limit, config),
+                }
+            )
+            for i, (chunk, limit) in enumerate(self._chunk_requests(text, config))
+        ]
+
+        client = self.client
+
+        try:
+            input_file = client.files.create(
+                file=("flashcards.jsonl", b"\n".join(lines)),
+                purpose="batch",
+            )
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            )
+        except openai.APIError as e:
+            raise OpenAIError(f"API error: {e}") from e
+
+        return batch.id
+
+    def poll_batch(
+        self,
+        batch_id: str,
+        config: GenerationConfig,
+    ) -> GenerationResult | None:
+        """Collect the result of a job submitted with generate_flashcards_batch().
+
+        Args:
+            batch_id: ID returned by generate_flashcards_batch()
+            config: The generation configuration the job was submitted with
+
+        Returns:
+            GenerationResult with cards and cost data, or None if the job
+            has not finished yet. Requests of the job that failed are counted
+            in its failed_requests.
+
+        Raises:
+            OpenAIError: If the job failed, expired or was cancelled, or if
+                every request in it failed
+        """
+        _require_openai()
+
+        client = self.client
+
+        try:
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in _BATCH_PENDING_STATES:
+                return None
+            if batch.status != "completed":
+                raise OpenAIError(f"Batch job {batch.status}")
+            # Successful requests are written to the output file, and failed
+            # ones to the error file; either may be missing
+            output = "\n".join(
+                client.files.content(file_id).text
+                for file_id in (batch.output_file_id, batch.error_file_id)
+                if file_id
+            )
+        except openai.APIError as e:
+            raise OpenAIError(f"API error: {e}") from e
+
+        # Output lines are not guaranteed to be in submission order
+        results = sorted(
+            (from_json_bytes(line) for line in output.splitlines() if line.strip()),
+            key=lambda result: int(result["custom_id"].removeprefix("chunk-")),
+        )
+
+        all_cards: list[GeneratedCard] = []
+        total_prompt_tokens = 0
+        total_completion_tokens = 0
+        total_cached_tokens = 0
+        errors: list[str] = []
+        # Every request of a completed job has a line in one of the files, so
+        # this gives the same shares the requests were submitted with
+        chunk_limits = _split_card_limit(config.card_limit, len(results))
+
+        for result, chunk_limit in zip(results, chunk_limits):
+            response = result.get("response") or {}
+            if response.get("status_code") != 200:
+                errors.append(_batch_error_message(result))
+                continue
+            body = response["body"]
+
+            usage = body.get("usage") or {}
+            total_prompt_tokens += usage.get("prompt_tokens", 0)
+            total_completion_tokens += usage.get("completion_tokens", 0)
+            details = usage.get("prompt_tokens_details") or {}
+            total_cached_tokens += details.get("cached_tokens") or 0
+
+            content = body["choices"][0]["message"]["content"]
+            if content:
+                all_cards.extend(self._parse_response(content, config)[:chunk_limit])
+
+        if len(errors) == len(results):
+            if not errors:
+                raise OpenAIError("Batch job completed without any results")
+            raise OpenAIError(f"All {len(errors)} batch requests failed: {errors[0]}")
+
+        pricing = MODEL_PRICING_BATCH.get(
+            self.model, MODEL_PRICING_BATCH[DEFAULT_MODEL]
+        )
+        cost_usd = _calculate_cost(
+            pricing, total_prompt_tokens, total_cached_tokens, total_completion_tokens
+        )
 
         return GenerationResult(
             cards=all_cards[: config.card_limit],
-            tokens_used=total_tokens,
+            tokens_used=total_prompt_tokens + total_completion_tokens,
             cost_usd=round(cost_usd, 6),
             model=self.model,
+            failed_requests=len(errors),
+        )
+
+    def _chunk_requests(
+        self, text: str, config: GenerationConfig
+    ) -> list[tuple[str, int]]:
+        """Chunk text if needed, and split the card budget between the chunks.
+
+        Returns (chunk, card_limit) pairs, leaving out chunks with no cards to
+        generate. Every chunk gets its share up front so that they can all be
+        requested at once.
+        """
+        chunks = chunk_text(text)
+        chunk_limits = _split_card_limit(config.card_limit, len(chunks))
+        return [
+            (chunk, limit) for chunk, limit in zip(chunks, chunk_limits) if limit > 0
+        ]
+
+    def _chunk_request_params(
+        self, chunk: str, chunk_limit: int, config: GenerationConfig
+    ) -> dict[str, Any]:
+        """Build the chat completion parameters for one chunk."""
+        chunk_config = GenerationConfig(
+            card_limit=chunk_limit,
+            preferred_card_type=config.preferred_card_type,
+            source_name=config.source_name,
+            auto_tags=config.auto_tags,
         )
+        return {
+            "model": self.model,
+            "messages": [
+                _SYSTEM_MESSAGE,
+                {
+                    "role": "user",
+                    "content": self._build_user_prompt(chunk, chunk_config),
+                },
+            ],
+            "temperature": 0.7,
+            "max_tokens": 4000,
+            "response_format": {"type": "json_object"},
+        }
 
     def regenerate_card(
         self,
@@ -268,7 +590,9 @@ class OpenAIFlashcardClient:
 
         Args:
             original_card: The card to regenerate
-            source_text: Original source text for context
+            source_text: Original source text for context. Only the first
+                REGENERATE_EXCERPT_CHARS characters are sent; slicing does
+                not scan the rest, so the full document can be passed.
             hint: Optional user hint for regeneration
 
         Returns:
@@ -277,10 +601,7 @@ class OpenAIFlashcardClient:
         Raises:
             OpenAIError: If regeneration fails
         """
-        try:
-            import openai
-        except ImportError as e:
-            raise OpenAIError("OpenAI library not installed") from e
+        _require_openai()
 
         user_feedback = f"- **User Feedback**: {hint}" if hint else ""
 
@@ -294,7 +615,7 @@ Create ONE new, high-quality flashcard to replace a rejected card. The new card
 {user_feedback}
 
 ### SOURCE TEXT EXCERPT ###
-{source_text[:2000]}
+{source_text[:REGENERATE_EXCERPT_CHARS]}
 
 ### EXAMPLES OF IMPROVEMENT ###
 
@@ -306,13 +627,13 @@ Create ONE new, high-quality flashcard to replace a rejected card. The new card
 Respond with valid JSON containing exactly one card:
 {{"cards": [{{"type": "basic", "front": "...", "back": "...", "suggested_tags": [...]}}]}}"""
 
-        client = openai.OpenAI(api_key=self.api_key)
+        client = self.client
 
         try:
             response = client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
+                    _SYSTEM_MESSAGE,
                     {"role": "user", "content": prompt},
                 ],
                 temperature=0.8,
@@ -336,27 +657,25 @@ Respond with valid JSON containing exactly one card:
 
     def _build_user_prompt(self, text: str, config: GenerationConfig) -> str:
         """Build the user prompt for card generation."""
-        parts = ["### TASK ###"]
-        parts.append(
+        preference = (
+            f"\n\nPrefer '{config.preferred_card_type.value}' card type when "
+            "appropriate for the content."
+            if config.preferred_card_type
+            else ""
+        )
+        source = (
+            f"\n\nSource context: {config.source_name}" if config.source_name else ""
+        )
+
+        # Built as one string, so the source text is only copied once
+        return (
+            "### TASK ###\n"
             f"Generate up to {config.card_limit} high-quality flashcards from the "
             "source text below. Apply the Rules of Formulation strictly—prioritize "
             "the Minimum Information Principle above all else."
+            f"{preference}{source}\n\n\n### SOURCE TEXT ###\n{text}"
         )
 
-        if config.preferred_card_type:
-            parts.append(
-                f"\nPrefer '{config.preferred_card_type.value}' card type when "
-                "appropriate for the content."
-            )
-
-        if config.source_name:
-            parts.append(f"\nSource context: {config.source_name}")
-
-        parts.append("\n\n### SOURCE TEXT ###")
-        parts.append(text)
-
-        return "\n".join(parts)
-
     def _parse_response(
         self,
         response_text: str,
@@ -365,43 +684,200 @@ Respond with valid JSON containing exactly one card:
         """Parse the OpenAI response into GeneratedCard objects."""
         try:
             # Try to parse as JSON
-            data = json.loads(response_text)
+            data = from_json_bytes(response_text)
 
             if "cards" not in data:
                 raise OpenAIError("Response missing 'cards' field")
 
-            cards = []
-            for card_data in data["cards"]:
-                try:
-                    card_type = CardType(card_data["type"])
-                except ValueError:
-                    # Default to basic if type is invalid
-                    card_type = CardType.BASIC
-
-                # Combine auto_tags with suggested_tags
-                tags = list(config.auto_tags)
-                source_tag = config.get_source_tag()
-                if source_tag:
-                    tags.append(source_tag)
-                tags.extend(card_data.get("suggested_tags", []))
-
-                card = GeneratedCard(
-                    card_type=card_type,
-                    front=card_data.get("front", ""),
-                    back=card_data.get("back", ""),
-                    suggested_tags=tags,
-                )
-                cards.append(card)
-
-            return cards
+            return self._cards_from_data(data["cards"], config)
 
         except json.JSONDecodeError:
-            # Try to extract JSON from the response
-            json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
-            if json_match:
-                return self._parse_response(json_match.group(), config)
+            # Try to extract JSON from the response. Stop if there is nothing
+            # else to extract, as it would fail to parse again.
+            json_text = _extract_json_object(response_text)
+            if json_text and json_text != response_text:
+                return self._parse_response(json_text, config)
             raise OpenAIError("Failed to parse response as JSON")
 
+    def _cards_from_data(
+        self,
+        cards_data: list[dict[str, Any]],
+        config: GenerationConfig,
+    ) -> list[GeneratedCard]:
+        """Build GeneratedCard objects from decoded card JSON."""
+        # Tags added to every card, ahead of its suggested tags
+        base_tags = list(config.auto_tags)
+        source_tag = config.get_source_tag()
+        if source_tag:
+            base_tags.append(source_tag)
+
+        cards = []
+        for card_data in cards_data:
+            # Default to basic if type is missing or invalid. The model may
+            # send any JSON value, so convert it to a string to look it up.
+            card_type = _CARD_TYPE_MAP.get(str(card_data.get("type")), CardType.BASIC)
+
+            card = GeneratedCard(
+                card_type=card_type,
+                front=card_data.get("front", ""),
+                back=card_data.get("back", ""),
+                suggested_tags=[*base_tags, *card_data.get("suggested_tags", ())],
+            )
+            cards.append(card)
+
+        return cards
+
+
+def _require_openai() -> None:
+    """Raise OpenAIError if the openai library is not installed."""
+    if openai is None:
+        raise OpenAIError(_OPENAI_MISSING)
+
+
+def _calculate_cost(
+    pricing: dict[str, float],
+    prompt_tokens: int,
+    cached_tokens: int,
+    completion_tokens: int,
+) -> float:
+    """Calculate the USD cost of a request from its token usage."""
+    return (
+        (prompt_tokens - cached_tokens) * pricing["input"]
+        + cached_tokens * pricing["cached_input"]
+        + completion_tokens * pricing["output"]
+    ) / 1_000_000
+
+
+def _batch_error_message(result: dict[str, Any]) -> str:
+    """Return the error message of a failed Batch API result line."""
+    error = result.get("error")
+    if not error:
+        body = (result.get("response") or {}).get("body") or {}
+        error = body.get("error") if isinstance(body, dict) else None
+    if isinstance(error, dict) and error.get("message"):
+        return str(error["message"])
+    return "unknown error"
+
+
+def _extract_json_object(text: str) -> str | None:
+    """Return the first balanced {...} object in text, if any.
+
+    Scans the text once, ignoring braces inside JSON strings.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+
+    return None
+
+
+def _split_card_limit(card_limit: int, num_chunks: int) -> list[int]:
+    """Split a card budget as evenly as possible between chunks.
+
+    Earlier chunks receive any remainder. If there are more chunks than cards,
+    the trailing chunks get a limit of 0.
+    """
+    if not num_chunks:
+        return []
+    share, remainder = divmod(card_limit, num_chunks)
+    return [share + 1 if i < remainder else share for i in range(num_chunks)]
+
+
+class _CardStreamParser:
+    """Picks complete card objects out of a response as it is streamed.
+
+    Expects the {"cards": [{...}, ...]} shape requested by SYSTEM_PROMPT, and
+    returns each object in the "cards" array as soon as its closing brace
+    arrives. Arrays under any other key are skipped.
+    """
+
+    def __init__(self) -> None:
+        # Open brackets, outermost first
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._in_card = False
+        # Text of the current card received in earlier calls to feed()
+        self._pending = ""
+        # Last string seen directly inside the root object, ie the key of
+        # the value that follows it, and whether it is still being received
+        self._key = ""
+        self._in_key = False
+        # True while inside the root "cards" array
+        self._in_cards = False
+
+    def feed(self, text: str) -> list[dict[str, Any]]:
+        """Consume the next piece of the response, returning completed cards."""
+        cards: list[dict[str, Any]] = []
+        card_start = 0
+        key_start = 0
+
+        for i, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._in_key:
+                        self._in_key = False
+                        self._key += text[key_start:i]
+            elif char == '"':
+                self._in_string = True
+                if self._stack == ["{"]:
+                    self._in_key = True
+                    self._key = ""
+                    key_start = i + 1
+            elif char in "{[":
+                if char == "[" and self._stack == ["{"]:
+                    self._in_cards = self._key == "cards"
+                elif char == "{" and self._in_cards and self._stack == ["{", "["]:
+                    self._in_card = True
+                    card_start = i
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._in_card and self._stack == ["{", "["]:
+                    self._in_card = False
+                    card_text = self._pending + text[card_start : i + 1]
+                    self._pending = ""
+                    try:
+                        card_data = from_json_bytes(card_text)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(card_data, dict):
+                        cards.append(card_data)
+
+        if self._in_card:
+            self._pending += text[card_start:]
+        if self._in_key:
+            self._key += text[key_start:]
+
+        return cards
+
 
 def test_api_key(api_key: str) -> tuple[bool, str | None]:
     """Test if an API key is valid.
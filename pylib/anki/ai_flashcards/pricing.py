@@ -0,0 +1,55 @@
+# Copyright: Ankitects Pty Ltd and contributors
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+"""OpenAI model pricing and cost estimation for AI flashcard generation.
+
+Kept apart from openai_client, so that estimating a cost does not need the
+openai library to be loaded.
+"""
+
+from __future__ import annotations
+
+from anki.ai_flashcards.document_parser import estimate_tokens
+from anki.ai_flashcards.models import CostEstimate
+
+# OpenAI model configuration
+DEFAULT_MODEL = "gpt-4o"
+# Pricing per 1M tokens (as of late 2024). Prompt tokens served from OpenAI's
+# prompt cache are billed at the cached_input rate.
+MODEL_PRICING = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    # No prompt caching discount on this model
+    "gpt-4-turbo": {"input": 10.00, "cached_input": 10.00, "output": 30.00},
+}
+# Requests made through the Batch API are billed at half the usual rate
+MODEL_PRICING_BATCH = {
+    model: {rate: price / 2 for rate, price in prices.items()}
+    for model, prices in MODEL_PRICING.items()
+}
+
+
+def estimate_cost(text: str, model: str = DEFAULT_MODEL) -> CostEstimate:
+    """Estimate the cost of generating flashcards from the given text.
+
+    Args:
+        text: The text to process
+        model: The model that would be used for generation
+
+    Returns:
+        Cost estimate with tokens and USD
+    """
+    input_tokens = estimate_tokens(text)
+    # Estimate output tokens (roughly 50% of input for flashcards)
+    output_tokens = input_tokens // 2
+
+    pricing = MODEL_PRICING.get(model, MODEL_PRICING[DEFAULT_MODEL])
+    cost = (
+        input_tokens * pricing["input"] + output_tokens * pricing["output"]
+    ) / 1_000_000
+
+    return CostEstimate(
+        estimated_tokens=input_tokens + output_tokens,
+        estimated_cost_usd=round(cost, 4),
+        model=model,
+    )
@@ -0,0 +1,182 @@
+# Copyright: Ankitects Pty Ltd and contributors
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+from __future__ import annotations
+
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+# openai is an optional dependency of the client module
+pytest.importorskip("openai")
+
+from anki.ai_flashcards.models import GenerationConfig
+from anki.ai_flashcards.openai_client import (
+    OpenAIError,
+    OpenAIFlashcardClient,
+    _CardStreamParser,
+    _extract_json_object,
+)
+
+
+def _batch_client(status: str, files: dict[str, str], **batch) -> OpenAIFlashcardClient:
+    """Return a client whose OpenAI client serves a single batch job."""
+    batch.setdefault("output_file_id", None)
+    batch.setdefault("error_file_id", None)
+    client = OpenAIFlashcardClient("sk-test")
+    client._client = SimpleNamespace(  # type: ignore[assignment]
+        batches=SimpleNamespace(
+            retrieve=lambda batch_id: SimpleNamespace(status=status, **batch)
+        ),
+        files=SimpleNamespace(
+            content=lambda file_id: SimpleNamespace(text=files[file_id])
+        ),
+    )
+    return client
+
+
+def _ok_line(index: int, *fronts: str) -> str:
+    cards = [{"type": "basic", "front": front, "back": "b"} for front in fronts]
+    content = json.dumps({"cards": cards})
+    body = {
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 10},
+    }
+    return json.dumps(
+        {
+            "custom_id": f"chunk-{index}",
+            "response": {"status_code": 200, "body": body},
+        }
+    )
+
+
+def _error_line(index: int, message: str) -> str:
+    body = {"error": {"message": message, "type": "invalid_request_error"}}
+    return json.dumps(
+        {
+            "custom_id": f"chunk-{index}",
+            "response": {"status_code": 400, "body": body},
+        }
+    )
+
+
+def test_poll_batch_pending():
+    client = _batch_client("in_progress", {})
+    assert client.poll_batch("batch", GenerationConfig()) is None
+
+
+def test_poll_batch_completed():
+    output = "\n".join([_ok_line(1, "second"), _ok_line(0, "first")])
+    client = _batch_client("completed", {"out": output}, output_file_id="out")
+    result = client.poll_batch("batch", GenerationConfig())
+    assert result is not None
+    # results are put back into submission order
+    assert [card.front for card in result.cards] == ["first", "second"]
+    assert result.tokens_used == 220
+    assert result.failed_requests == 0
+
+
+def test_poll_batch_card_limit():
+    # each request is held to its share of the limit, as when streaming
+    output = "\n".join([_ok_line(0, "a", "b", "c"), _ok_line(1, "d", "e", "f")])
+    client = _batch_client("completed", {"out": output}, output_file_id="out")
+    result = client.poll_batch("batch", GenerationConfig(card_limit=3))
+    assert result is not None
+    assert [card.front for card in result.cards] == ["a", "b", "d"]
+
+
+def test_poll_batch_partial_failure():
+    client = _batch_client(
+        "completed",
+        {"out": _ok_line(0, "first"), "err": _error_line(1, "too long")},
+        output_file_id="out",
+        error_file_id="err",
+    )
+    result = client.poll_batch("batch", GenerationConfig())
+    assert result is not None
+    assert [card.front for card in result.cards] == ["first"]
+    assert result.failed_requests == 1
+
+
+def test_poll_batch_all_failed():
+    errors = "\n".join([_error_line(0, "too long"), _error_line(1, "too long")])
+    client = _batch_client("completed", {"err": errors}, error_file_id="err")
+    with pytest.raises(OpenAIError, match="All 2 batch requests failed: too long"):
+        client.poll_batch("batch", GenerationConfig())
+
+
+def test_poll_batch_not_completed():
+    client = _batch_client("expired", {})
+    with pytest.raises(OpenAIError, match="Batch job expired"):
+        client.poll_batch("batch", GenerationConfig())
+
+
+_CARDS = [
+    {"type": "basic", "front": "What is {x}?", "back": 'A "quoted" } brace'},
+    {"type": "cloze", "front": "{{c1::Paris}} is in France", "back": "", "tags": ["a"]},
+    {"type": "basic", "front": "Escaped \\ backslash", "back": "[not an array]"},
+]
+
+
+def _feed_in_pieces(text: str, sizes: list[int]) -> list[dict]:
+    parser = _CardStreamParser()
+    cards = []
+    pos = 0
+    for size in sizes:
+        cards.extend(parser.feed(text[pos : pos + size]))
+        pos += size
+    cards.extend(parser.feed(text[pos:]))
+    return cards
+
+
+def test_stream_parser_split_chunks():
+    text = json.dumps({"cards": _CARDS})
+    assert _feed_in_pieces(text, []) == _CARDS
+    # one character at a time
+    assert _feed_in_pieces(text, [1] * len(text)) == _CARDS
+    rng = random.Random(0)
+    for _ in range(200):
+        sizes = [rng.randint(1, 20) for _ in range(len(text) // 5)]
+        assert _feed_in_pieces(text, sizes) == _CARDS
+
+
+def test_stream_parser_only_reads_cards_key():
+    text = json.dumps(
+        {
+            "notes": [{"front": "not a card"}],
+            "title": "cards",
+            "cards": _CARDS[:1],
+            "extra": [{"front": "also not a card"}],
+        }
+    )
+    assert _feed_in_pieces(text, [3] * len(text)) == _CARDS[:1]
+    # a top-level array is not the expected shape
+    assert _feed_in_pieces(json.dumps(_CARDS), []) == []
+    # the key itself may be split between chunks
+    assert _feed_in_pieces('{"ca', [2, 2]) == []
+    assert _feed_in_pieces('{"ca' + 'rds": [{"a": 1}]}', [4]) == [{"a": 1}]
+
+
+def test_stream_parser_malformed():
+    # cards that are not valid JSON are skipped, later ones still parse
+    text = '{"cards": [{"front": oops}, {"front": "ok"}, "str", 3, {"front": "end"'
+    assert _feed_in_pieces(text, [5] * len(text)) == [{"front": "ok"}]
+    # stray closing brackets and surrounding prose are ignored
+    text = 'Here you go: ]} {"cards": [{"front": "x"}]} done'
+    assert _feed_in_pieces(text, []) == [{"front": "x"}]
+    text = 'Here you go: {"cards": [{"front": "x"}]} done ]]'
+    assert _feed_in_pieces(text, []) == [{"front": "x"}]
+    assert _feed_in_pieces("", []) == []
+
+
+def test_extract_json_object():
+    obj = json.dumps({"cards": _CARDS})
+    assert _extract_json_object(obj) == obj
+    assert _extract_json_object(f"```json\n{obj}\n```") == obj
+    assert _extract_json_object(f"{obj} {{}}") == obj
+    assert _extract_json_object('x {"a": "}{"} y') == '{"a": "}{"}'
+    assert _extract_json_object('{"a": "\\"}"}') == '{"a": "\\"}"}'
+    assert _extract_json_object("no json here") is None
+    assert _extract_json_object('{"a": {"b": 1}') is None
@@ -0,0 +1,101 @@
+# Copyright: Ankitects Pty Ltd and contributors
+# License: GNU AGPL, version 3 or later; http://www.gnu.org/licenses/agpl.html
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from anki.ai_flashcards import document_parser
+from anki.ai_flashcards.document_parser import chunk_text
+
+if TYPE_CHECKING:
+    import tiktoken
+else:
+    tiktoken = pytest.importorskip("tiktoken")
+
+
+def _byte_encoder(*merges: bytes) -> tiktoken.Encoding:
+    """Return an encoder with one token per byte, plus the given merges.
+
+    Unlike the real encodings, this needs no download.
+    """
+    ranks = {bytes([i]): i for i in range(256)}
+    for merge in merges:
+        ranks[merge] = len(ranks)
+    return tiktoken.Encoding(
+        "test", pat_str=r"\S+|\s+", mergeable_ranks=ranks, special_tokens={}
+    )
+
+
+@pytest.fixture
+def use_encoder(monkeypatch):
+    def use(encoder: tiktoken.Encoding | None) -> None:
+        monkeypatch.setattr(document_parser, "_get_encoder", lambda: encoder)
+        document_parser._token_counts.clear()
+
+    yield use
+    document_parser._token_counts.clear()
+
+
+def test_chunk_text_fallback(use_encoder):
+    # without tiktoken, every 4 characters count as a token
+    use_encoder(None)
+    assert chunk_text("short", max_tokens=10) == ["short"]
+    assert chunk_text("é" * 40, max_tokens=10) == ["é" * 40]
+
+    para = "a" * 40
+    text = "\n\n".join([para] * 5)
+    assert chunk_text(text, max_tokens=25) == [
+        f"{para}\n\n{para}",
+        f"{para}\n\n{para}",
+        para,
+    ]
+
+    # an oversized paragraph is split between sentences, and the paragraphs
+    # around it get their own chunks
+    sentence = "x" * 20 + "."
+    long_para = " ".join([sentence] * 5)
+    text = f"intro\n\n{long_para}\n\noutro"
+    assert chunk_text(text, max_tokens=12) == [
+        "intro",
+        f"{sentence} {sentence}",
+        f"{sentence} {sentence}",
+        f"{sentence}\n\noutro",
+    ]
+
+
+def test_chunk_text_tiktoken(use_encoder):
+    use_encoder(_byte_encoder())
+    assert chunk_text("abc\n\ndef\n\nghi", max_tokens=7) == ["abc\n\ndef", "ghi"]
+    assert chunk_text("abc\n\ndef\n\nghi", max_tokens=13) == ["abc\n\ndef\n\nghi"]
+    # non-ASCII characters take several tokens
+    assert chunk_text("é" * 5, max_tokens=10) == ["é" * 5]
+    assert chunk_text("é" * 5 + "\n\nab", max_tokens=10) == ["é" * 5, "ab"]
+    # a sentence longer than the limit is kept whole
+    assert chunk_text("é" * 6, max_tokens=10) == ["é" * 6]
+
+
+def test_chunk_text_long_tokens(use_encoder):
+    use_encoder(
+        _byte_encoder(b"aa", b"a" * 4, b"a" * 8, b"a" * 16, b" \n", b" \n\n", b" \n\n ")
+    )
+    # 3 tokens as a whole, but 4 when the paragraphs are counted separately.
+    # Text this long per token must still be checked as a whole.
+    text = "a" * 16 + " \n\n " + "a" * 16
+    assert document_parser.estimate_tokens(text) == 3
+    assert chunk_text(text, max_tokens=3) == [text]
+    assert chunk_text(text, max_tokens=2) == ["a" * 16 + " ", " " + "a" * 16]
+
+
+def test_estimate_tokens_cache(use_encoder):
+    use_encoder(_byte_encoder())
+    assert document_parser.estimate_tokens("abc") == 3
+    assert len(document_parser._token_counts) == 1
+    assert document_parser.estimate_tokens("abc") == 3
+    assert len(document_parser._token_counts) == 1
+
+    for i in range(20):
+        assert document_parser.estimate_tokens("x" * i) == i
+    assert len(document_parser._token_counts) == 8
@@ -5,16 +5,30 @@
 
 from __future__ import annotations
 
-import json
 from concurrent.futures import Future
-from typing import Any
+from typing import Any, Callable
 
 import aqt
 import aqt.main
+from anki.ai_flashcards.document_parser import get_source_name, parse_url
+from anki.ai_flashcards.models import CardType, GeneratedCard, GenerationConfig
+from anki.ai_flashcards.pricing import estimate_cost
+from anki.utils import from_json_bytes, to_json_bytes
 from aqt.qt import *
 from aqt.utils import disable_help_button, restoreGeom, saveGeom
 from aqt.webview import AnkiWebView, AnkiWebViewKind
 
+_BRIDGE_PREFIX = "ai_flashcards:"
+# The exact message the page sends once it has loaded
+_READY_PAYLOAD = '{"action":"ready"}'
+
+# CardType -> the integer the frontend uses for it
+_CARD_TYPE_INT = {
+    CardType.BASIC: 0,
+    CardType.BASIC_REVERSED: 1,
+    CardType.CLOZE: 2,
+}
+
 
 class AIFlashcardsDialog(QDialog):
     """Dialog for AI-powered flashcard generation."""
@@ -52,46 +66,50 @@ class AIFlashcardsDialog(QDialog):
 
     def _on_bridge_cmd(self, cmd: str) -> Any:
         """Handle bridge commands from the frontend."""
-        if not cmd.startswith("ai_flashcards:"):
+        payload = cmd.removeprefix(_BRIDGE_PREFIX)
+        # removeprefix() returns the same object when the prefix is absent
+        if payload is cmd:
             return None
+        if payload == _READY_PAYLOAD:
+            return self._handle_ready({})
 
         try:
-            request = json.loads(cmd[len("ai_flashcards:") :])
-            action = request.get("action")
-
-            if action == "ready":
-                self.set_ready()
-                return json.dumps({"ok": True})
-            elif action == "generate_flashcards":
-                return self._handle_generate(request)
-            elif action == "estimate_cost":
-                return self._handle_estimate_cost(request)
-            elif action == "fetch_url":
-                return self._handle_fetch_url(request)
-            elif action == "test_connection":
-                return self._handle_test_connection()
-            elif action == "refresh_decks":
-                # Trigger main window to refresh deck browser
-                self.mw.reset()
-                return json.dumps({"ok": True})
-            else:
-                return json.dumps({"error": f"Unknown action: {action}"})
-        except Exception as e:
-            return json.dumps({"error": str(e)})
+            request = from_json_bytes(payload)
+        except ValueError as e:
+            return _dumps({"error": str(e)})
+
+        action = request.get("action") if isinstance(request, dict) else None
+        handler = self._ACTIONS.get(action) if isinstance(action, str) else None
+        if handler is None:
+            return _dumps({"error": f"Unknown action: {action}"})
+        # Handlers report expected failures (network, parsing) in their
+        # replies; anything else is a bug and goes to Anki's error handler
+        return handler(self, request)
+
+    def _handle_ready(self, request: dict[str, Any]) -> str:
+        """Handle the frontend's page-loaded notification."""
+        self.set_ready()
+        return _dumps({"ok": True})
+
+    def _handle_refresh_decks(self, request: dict[str, Any]) -> str:
+        """Trigger main window to refresh deck browser."""
+        self.mw.reset()
+        return _dumps({"ok": True})
 
     def _handle_generate(self, request: dict[str, Any]) -> str:
         """Handle flashcard generation request - starts async operation."""
         text = request.get("text", "")
         source_name = request.get("sourceName", "")
 
-        if not text.strip():
-            return json.dumps(
-                {"error": "Please provide text to generate flashcards from."}
-            )
+        # Fields come from the page, so check their types before using them
+        if not isinstance(text, str) or not text.strip():
+            return _dumps({"error": "Please provide text to generate flashcards from."})
+        if not isinstance(source_name, str):
+            return _dumps({"error": "Invalid source name."})
 
         api_key = self._get_api_key()
         if not api_key:
-            return json.dumps(
+            return _dumps(
                 {
                     "error": "OpenAI API key is not configured. Please set it in Preferences."
                 }
@@ -103,14 +121,19 @@ class AIFlashcardsDialog(QDialog):
             uses_collection=False,
         )
 
-        return json.dumps({"status": "generating"})
+        return _dumps({"status": "generating"})
 
     def _generate_flashcards_task(
         self, text: str, source_name: str, api_key: str
-    ) -> dict[str, Any]:
-        """Background task that calls OpenAI API. Runs in thread pool."""
+    ) -> str:
+        """Background task that calls OpenAI API. Runs in thread pool.
+
+        Returns the JSON payload for the frontend, so the cards are converted
+        and serialized here rather than on the main thread.
+        """
         try:
-            from anki.ai_flashcards.models import GenerationConfig
+            # Imported here, as loading the openai library is slow and this
+            # module is imported at startup
             from anki.ai_flashcards.openai_client import OpenAIFlashcardClient
 
             client = OpenAIFlashcardClient(api_key)
@@ -119,108 +142,104 @@ class AIFlashcardsDialog(QDialog):
                 source_name=source_name,
             )
 
-            result = client.generate_flashcards(text, config)
+            result = client.generate_flashcards(
+                text, config, on_card=self._on_card_generated
+            )
 
-            return {
-                "success": True,
-                "cards": result.cards,
-                "tokens_used": result.tokens_used,
-                "cost_usd": result.cost_usd,
-                "model": result.model,
-            }
+            return _dumps(
+                {
+                    "cards": [_card_json(card) for card in result.cards],
+                    "tokens_used": result.tokens_used,
+                    "cost_usd": result.cost_usd,
+                    "model": result.model,
+                }
+            )
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return _dumps({"error": str(e)})
 
-    def _on_generate_done(self, future: Future) -> None:
+    def _on_card_generated(self, card: GeneratedCard) -> None:
+        """Send a card to the frontend as soon as it is parsed. Runs in thread pool."""
+        payload = _dumps(_card_json(card))
+        self.mw.taskman.run_on_main(lambda: self._push_card(payload))
+
+    def _push_card(self, payload: str) -> None:
+        """Called on main thread for each card streamed in during generation."""
+        if self._closed or self.web is None:
+            return
+
+        self.web.eval(f"window._aiFlashcardsOnCard(JSON.parse({_dumps(payload)}))")
+
+    def _on_generate_done(self, future: Future[str]) -> None:
         """Called on main thread when generation completes."""
         if self._closed or self.web is None:
             return
 
         try:
-            result = future.result()
-            if result["success"]:
-                cards_json = [
-                    {
-                        "id": card.id,
-                        "cardType": _card_type_to_int(card.card_type),
-                        "front": card.front,
-                        "back": card.back,
-                        "suggestedTags": card.suggested_tags,
-                        "status": 0,
-                    }
-                    for card in result["cards"]
-                ]
-                response = json.dumps(
-                    {
-                        "cards": cards_json,
-                        "tokens_used": result.get("tokens_used", 0),
-                        "cost_usd": result.get("cost_usd", 0),
-                        "model": result.get("model", ""),
-                    }
-                )
-            else:
-                response = json.dumps({"error": result["error"]})
+            response = future.result()
         except Exception as e:
-            response = json.dumps({"error": str(e)})
+            response = _dumps({"error": str(e)})
 
-        self.web.eval(f"window._aiFlashcardsOnGenerate({response})")
+        # Pass the payload as a string literal for JSON.parse, which is much
+        # cheaper for the JS engine than parsing an equivalent object literal
+        self.web.eval(f"window._aiFlashcardsOnGenerate(JSON.parse({_dumps(response)}))")
 
     def _handle_fetch_url(self, request: dict[str, Any]) -> str:
-        """Handle URL fetch request."""
+        """Handle URL fetch request - starts async operation."""
         url = request.get("url", "")
 
-        if not url.strip():
-            return json.dumps({"error": "Please provide a URL to fetch."})
+        if not isinstance(url, str) or not url.strip():
+            return _dumps({"error": "Please provide a URL to fetch."})
 
-        try:
-            from anki.ai_flashcards.document_parser import get_source_name, parse_url
+        self.mw.taskman.run_in_background(
+            task=lambda: self._fetch_url_task(url),
+            on_done=self._on_fetch_url_done,
+            uses_collection=False,
+        )
 
+        return _dumps({"status": "fetching"})
+
+    def _fetch_url_task(self, url: str) -> str:
+        """Background task that downloads and parses a URL. Runs in thread pool."""
+        try:
             text = parse_url(url)
             source_name = get_source_name(url, "url")
 
-            return json.dumps({"text": text, "sourceName": source_name})
+            return _dumps({"text": text, "sourceName": source_name})
 
         except Exception as e:
-            return json.dumps({"error": f"Failed to fetch URL: {e}"})
+            return _dumps({"error": f"Failed to fetch URL: {e}"})
+
+    def _on_fetch_url_done(self, future: Future[str]) -> None:
+        """Called on main thread when the URL fetch completes."""
+        if self._closed or self.web is None:
+            return
+
+        try:
+            response = future.result()
+        except Exception as e:
+            response = _dumps({"error": f"Failed to fetch URL: {e}"})
+
+        self.web.eval(f"window._aiFlashcardsOnFetchUrl(JSON.parse({_dumps(response)}))")
 
     def _handle_estimate_cost(self, request: dict[str, Any]) -> str:
         """Handle cost estimation request."""
         text = request.get("text", "")
 
-        if not text.strip():
-            return json.dumps({"error": "No text provided for estimation."})
+        if not isinstance(text, str) or not text.strip():
+            return _dumps({"error": "No text provided for estimation."})
 
         try:
-            from anki.ai_flashcards.openai_client import OpenAIFlashcardClient
-
-            # We don't need a valid API key for estimation, just use a placeholder
-            client = OpenAIFlashcardClient("estimation-only")
-            estimate = client.estimate_cost(text)
-            return json.dumps(estimate.to_dict())
-        except Exception as e:
-            return json.dumps({"error": f"Failed to estimate cost: {e}"})
-
-    def _handle_test_connection(self) -> str:
-        """Test the OpenAI API connection."""
-        try:
-            api_key = self._get_api_key()
-            if not api_key:
-                return json.dumps(
-                    {
-                        "success": False,
-                        "error": "OpenAI API key is not configured. Please set it in Preferences.",
-                    }
-                )
-
-            from anki.ai_flashcards.openai_client import test_api_key
-
-            success, error = test_api_key(api_key)
-            return json.dumps({"success": success, "error": error})
+            estimate = estimate_cost(text)
+            return _dumps(estimate.to_dict())
         except Exception as e:
-            return json.dumps({"success": False, "error": str(e)})
+            return _dumps({"error": f"Failed to estimate cost: {e}"})
 
     def _get_api_key(self) -> str | None:
-        """Get the OpenAI API key from the profile."""
+        """Get the OpenAI API key from the profile.
+
+        Deobfuscation is cached by aqt.secret, so this is cheap to call for
+        every bridge command.
+        """
         try:
             return self.mw.pm.ai_openai_api_key()
         except Exception:
@@ -260,18 +279,31 @@ class AIFlashcardsDialog(QDialog):
         self._close_dialog()
         QDialog.reject(self)
 
-
-def _card_type_to_int(card_type) -> int:
-    """Convert CardType enum to int for frontend."""
-    from anki.ai_flashcards.models import CardType
-
-    if card_type == CardType.BASIC:
-        return 0
-    elif card_type == CardType.BASIC_REVERSED:
-        return 1
-    elif card_type == CardType.CLOZE:
-        return 2
-    return 0
+    # Bridge action name -> handler, looked up once per bridge command
+    _ACTIONS: dict[str, Callable[[AIFlashcardsDialog, dict[str, Any]], str]] = {
+        "ready": _handle_ready,
+        "generate_flashcards": _handle_generate,
+        "estimate_cost": _handle_estimate_cost,
+        "fetch_url": _handle_fetch_url,
+        "refresh_decks": _handle_refresh_decks,
+    }
+
+
+def _dumps(obj: Any) -> str:
+    """Serialize obj to a JSON string for the webview, using orjson."""
+    return to_json_bytes(obj).decode("utf-8")
+
+
+def _card_json(card: GeneratedCard) -> dict[str, Any]:
+    """Convert a generated card to the shape the frontend expects."""
+    return {
+        "id": card.id,
+        "cardType": _CARD_TYPE_INT.get(card.card_type, 0),
+        "front": card.front,
+        "back": card.back,
+        "suggestedTags": card.suggested_tags,
+        "status": 0,
+    }
 
 
 def open_ai_flashcards(mw: aqt.main.AnkiQt) -> AIFlashcardsDialog:
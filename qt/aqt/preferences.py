@@ -11,10 +11,11 @@ import anki.lang
 import aqt
 import aqt.forms
 import aqt.operations
-from anki.collection import OpChanges
+from anki.collection import Collection, OpChanges
 from anki.utils import is_mac
 from aqt import AnkiQt
 from aqt.ankihub import ankihub_login, ankihub_logout
+from aqt.operations import QueryOp
 from aqt.operations.collection import set_preferences
 from aqt.profiles import VideoDriver
 from aqt.qt import *
@@ -334,7 +335,14 @@ class Preferences(QDialog):
         self.form.aiConnectionStatus.setText("Testing...")
         self.form.aiTestConnection.setEnabled(False)
 
-        def on_done(success: bool, error: str | None = None) -> None:
+        def test(_col: Collection) -> tuple[bool, str | None]:
+            # Imported here, off the main thread, as loading openai is slow
+            from anki.ai_flashcards.openai_client import test_api_key
+
+            return test_api_key(api_key)
+
+        def on_success(result: tuple[bool, str | None]) -> None:
+            success, error = result
             self.form.aiTestConnection.setEnabled(True)
             if success:
                 self.form.aiConnectionStatus.setText(
@@ -345,11 +353,14 @@ class Preferences(QDialog):
                     tr.preferences_ai_connection_failed(error=error or "Unknown error")
                 )
 
-        # Test the API key with OpenAI
-        from anki.ai_flashcards.openai_client import test_api_key
+        def on_failure(exc: Exception) -> None:
+            on_success((False, str(exc)))
 
-        success, error = test_api_key(api_key)
-        on_done(success, error)
+        # Test the API key with OpenAI in the background, so the network
+        # round trip doesn't freeze the preferences window
+        QueryOp(parent=self, op=test, success=on_success).failure(
+            on_failure
+        ).without_collection().run_in_background()
 
     # Global preferences
     ######################################################################
@@ -16,18 +16,39 @@ For truly secure storage, consider using OS-level keychains in the future:
 from __future__ import annotations
 
 import base64
+import functools
 import hashlib
 import platform
 
+# Marks values written by obfuscate_api_key, as opposed to legacy plain keys
+_V1_PREFIX = "v1:"
 
+
+@functools.lru_cache(maxsize=1)
 def _get_machine_id() -> bytes:
-    """Get a machine-specific identifier for key derivation."""
+    """Get a machine-specific identifier for key derivation.
+
+    The result does not change while Anki is running, so it is computed once.
+    """
     # Use a combination of platform info as a simple machine identifier
     # This means the obfuscated key won't work if copied to another machine
     machine_info = f"{platform.node()}-{platform.machine()}-anki-ai"
     return hashlib.sha256(machine_info.encode()).digest()[:16]
 
 
+def _xor_with_machine_id(data: bytes) -> bytes:
+    """XOR data with the machine ID, repeated to match its length."""
+    machine_id = _get_machine_id()
+    pad = (machine_id * (len(data) // len(machine_id) + 1))[: len(data)]
+    # One big-integer XOR instead of a Python loop over every byte
+    mixed = int.from_bytes(data, "big") ^ int.from_bytes(pad, "big")
+    return mixed.to_bytes(len(data), "big")
+
+
+# Both conversions depend only on their argument, as the machine ID is fixed
+# for the process, so recent results are memoized. The caches are kept small
+# to avoid holding on to many keys.
+@functools.lru_cache(maxsize=8)
 def obfuscate_api_key(api_key: str) -> str:
     """Obfuscate an API key for storage.
 
@@ -40,18 +61,13 @@ def obfuscate_api_key(api_key: str) -> str:
     if not api_key:
         return ""
 
-    key_bytes = api_key.encode("utf-8")
-    machine_id = _get_machine_id()
-
-    # XOR with machine ID (repeated to match length)
-    obfuscated = bytearray(len(key_bytes))
-    for i, byte in enumerate(key_bytes):
-        obfuscated[i] = byte ^ machine_id[i % len(machine_id)]
+    obfuscated = _xor_with_machine_id(api_key.encode("utf-8"))
 
     # Base64 encode for safe storage
-    return "v1:" + base64.b64encode(obfuscated).decode("ascii")
+    return _V1_PREFIX + base64.b64encode(obfuscated).decode("ascii")
 
 
+@functools.lru_cache(maxsize=8)
 def deobfuscate_api_key(obfuscated: str) -> str:
     """Deobfuscate a stored API key.
 
@@ -64,22 +80,18 @@ def deobfuscate_api_key(obfuscated: str) -> str:
     if not obfuscated:
         return ""
 
-    # Check version prefix
-    if not obfuscated.startswith("v1:"):
+    # Check and strip the version prefix in one pass; removeprefix() returns
+    # the same object when the prefix is absent
+    encoded = obfuscated.removeprefix(_V1_PREFIX)
+    if encoded is obfuscated:
         # Legacy unobfuscated key - return as-is for migration
         return obfuscated
 
     try:
-        encoded = obfuscated[3:]  # Remove "v1:" prefix
-        obfuscated_bytes = base64.b64decode(encoded)
-        machine_id = _get_machine_id()
+        obfuscated_bytes = base64.b64decode(encoded, validate=False)
 
         # XOR again to recover original
-        original = bytearray(len(obfuscated_bytes))
-        for i, byte in enumerate(obfuscated_bytes):
-            original[i] = byte ^ machine_id[i % len(machine_id)]
-
-        return original.decode("utf-8")
+        return _xor_with_machine_id(obfuscated_bytes).decode("utf-8")
     except Exception:
         # If anything goes wrong, return empty string
         return ""